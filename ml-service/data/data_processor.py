@@ -1,10 +1,144 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 DATA_PATH = Path(__file__).parent / "raw" / "FPL-Elo-Insights" / "data"
 
+# Narrowest dtypes that hold the known columns; halves the bytes the rolling
+# and groupby passes have to stream through
+LOAD_DTYPES = {
+    'id': 'int32',
+    'gw': 'int8',
+    'event_points': 'int16',
+    'minutes': 'int16',
+    'now_cost': 'int16',
+    'form': 'float32',
+    'selected_by_percent': 'float32',
+    'team': 'category',
+    'position': 'category',
+}
+
+# Columns the training pipeline actually reads; everything else is skipped
+PLAYER_GW_COLS = (
+    'id', 'event_points', 'minutes', 'form', 'now_cost',
+    'selected_by_percent', 'team', 'position',
+)
+MATCH_COLS = (
+    'home_team', 'away_team', 'home_expected_goals_xg', 'away_expected_goals_xg',
+)
+
+SAVE_FORMATS = ('parquet', 'csv')
+
+TEAM_STATS_COLUMNS = [
+    'team_id', 'team_name', 'elo',
+    'avg_xg_for', 'avg_xg_against',
+    'xg_for_home', 'xg_for_away', 'xg_against_home', 'xg_against_away',
+    'strength_attack_home', 'strength_attack_away',
+    'strength_defence_home', 'strength_defence_away',
+]
+
+
+def fits_integer(series, dtype):
+    # Only narrow when nothing is lost: no blanks, whole numbers, and every
+    # value inside the target type's range (astype would truncate or wrap)
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return False
+    values = series.to_numpy()
+    if len(values) == 0:
+        return True
+    info = np.iinfo(dtype)
+    if values.min() < info.min or values.max() > info.max:
+        return False
+    return np.array_equal(values, values.astype(dtype))
+
+
+def downcast(df):
+    dtypes = {}
+    for col, dtype in LOAD_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('int') and not fits_integer(df[col], dtype):
+            continue
+        dtypes[col] = dtype
+    return df.astype(dtypes)
+
+
+def read_csv(path, columns=None):
+    # Raw CSVs never change between runs, so keep a parquet copy alongside
+    # each one and only reparse when the CSV is newer (e.g. after a git pull)
+    parquet_path = path.with_suffix('.parquet')
+    if parquet_path.exists() and parquet_path.stat().st_mtime >= path.stat().st_mtime:
+        try:
+            if columns is not None:
+                available = pq.read_schema(parquet_path).names
+                columns = [col for col in columns if col in available]
+            return downcast(pd.read_parquet(parquet_path, engine="pyarrow", columns=columns))
+        except (OSError, pa.ArrowException) as e:
+            # A corrupt or truncated copy: reparse the CSV and rewrite it
+            print(f"  Warning: could not read cached {parquet_path.name}, reparsing: {e}")
+
+    # pyarrow parses with multiple threads and releases the GIL
+    df = pd.read_csv(path, engine="pyarrow")
+
+    # Write to a temp file and swap it in, so an interrupted write never
+    # leaves a partial parquet that looks newer than the CSV
+    tmp_path = parquet_path.with_name(parquet_path.name + '.tmp')
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+        os.replace(tmp_path, parquet_path)
+    except (OSError, pa.ArrowException) as e:
+        print(f"  Warning: could not cache {path.name} as parquet: {e}")
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+
+    return downcast(df)
+
+
+# In-process cache for the small per-season tables (teams, players) so
+# repeated training runs in one process skip reloading them; keyed by path
+# and invalidated when the file's mtime changes
+_load_cache = {}
+
+
+def read_csv_cached(path):
+    if os.environ.get('FPL_DISABLE_LOAD_CACHE'):
+        return read_csv(path)
+
+    mtime = path.stat().st_mtime
+    cached = _load_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1].copy(deep=False)
+
+    df = read_csv(path)
+    _load_cache[path] = (mtime, df)
+    return df.copy(deep=False)
+
+
+def concat_frames(frames):
+    # Per-gameweek files share a schema, so stitch each column with a single
+    # np.concatenate instead of going through pd.concat's block manager
+    columns = list(frames[0].columns)
+    if any(list(frame.columns) != columns for frame in frames[1:]):
+        return downcast(pd.concat(frames, ignore_index=True))
+
+    combined = pd.DataFrame(
+        {col: np.concatenate([frame[col].to_numpy() for frame in frames]) for col in columns},
+        copy=False,
+    )
+
+    # np.concatenate drops categoricals back to object, so re-apply the
+    # narrow dtypes once on the combined frame
+    return downcast(combined)
+
 
 def load_teams_with_elo(season='2025-2026'):
     teams_path = DATA_PATH / season / "teams.csv"
@@ -15,7 +149,7 @@ def load_teams_with_elo(season='2025-2026'):
         print(f"  Warning: teams.csv not found for {season}")
         return pd.DataFrame()
 
-    teams = pd.read_csv(teams_path)
+    teams = read_csv_cached(teams_path)
 
     print(f"  Loaded {len(teams)} teams from {season}")
     if 'elo' in teams.columns:
@@ -24,31 +158,58 @@ def load_teams_with_elo(season='2025-2026'):
     return teams
 
 
-def load_player_gameweek_stats(season='2025-2026', max_gw=None):
-    gw_path = DATA_PATH / season / "By Gameweek"
-
-    all_gw_data = []
-    gw_folders = sorted([f for f in os.listdir(gw_path) if f.startswith('GW')])
+def read_gameweek_files(gw_path, filename, columns=None, max_gw=None):
+    files = []
+    # Sort numerically so GW10 follows GW9 rather than GW1
+    gw_folders = sorted(gw_path.glob('GW*'), key=lambda p: int(p.name[2:]))
 
     for gw_folder in gw_folders:
-        gw_num = int(gw_folder.replace('GW', ''))
+        gw_num = int(gw_folder.name[2:])
 
         if max_gw and gw_num > max_gw:
             continue
 
-        stats_file = gw_path / gw_folder / "player_gameweek_stats.csv"
+        path = gw_folder / filename
+        if path.exists():
+            files.append((gw_num, path))
+
+    if not files:
+        return []
+
+    # Each read is I/O plus GIL-free pyarrow parsing, so overlap them;
+    # executor.map keeps results in gameweek order
+    with ThreadPoolExecutor(max_workers=min(16, os.cpu_count() or 1)) as executor:
+        frames = list(executor.map(lambda f: read_csv(f[1], columns=columns), files))
+
+    return [(gw_num, df) for (gw_num, _), df in zip(files, frames)]
+
 
-        if stats_file.exists():
-            gw_df = pd.read_csv(stats_file)
-            gw_df['gw'] = gw_num
-            gw_df['season'] = season
-            all_gw_data.append(gw_df)
+def stack_gameweeks(gw_files, season, add_gw=True):
+    # Tag gw/season once on the combined frame instead of adding a column to
+    # every per-gameweek frame and copying those through the concat
+    frames = [df for _, df in gw_files]
+    combined = concat_frames(frames)
 
-    if not all_gw_data:
+    if add_gw:
+        gw_nums = np.array([gw_num for gw_num, _ in gw_files], dtype=LOAD_DTYPES['gw'])
+        combined['gw'] = np.repeat(gw_nums, [len(df) for df in frames])
+    combined['season'] = season
+
+    return combined
+
+
+def load_player_gameweek_stats(season='2025-2026', max_gw=None):
+    gw_path = DATA_PATH / season / "By Gameweek"
+
+    gw_files = read_gameweek_files(
+        gw_path, "player_gameweek_stats.csv", columns=PLAYER_GW_COLS, max_gw=max_gw
+    )
+
+    if not gw_files:
         print(f"  Warning: No gameweek data found for {season}")
         return pd.DataFrame()
 
-    combined = pd.concat(all_gw_data, ignore_index=True)
+    combined = stack_gameweeks(gw_files, season)
     print(f"  Loaded {len(combined)} player-gameweek records from {season}")
     print(f"  Gameweeks: {combined['gw'].min()} to {combined['gw'].max()}")
 
@@ -58,22 +219,12 @@ def load_player_gameweek_stats(season='2025-2026', max_gw=None):
 def load_matches_with_team_xg(season='2025-2026'):
     gw_path = DATA_PATH / season / "By Gameweek"
 
-    all_matches = []
-    gw_folders = sorted([f for f in os.listdir(gw_path) if f.startswith('GW')])
-
-    for gw_folder in gw_folders:
-        gw_num = int(gw_folder.replace('GW', ''))
-        matches_file = gw_path / gw_folder / "matches.csv"
-
-        if matches_file.exists():
-            matches_df = pd.read_csv(matches_file)
-            matches_df['season'] = season
-            all_matches.append(matches_df)
+    gw_files = read_gameweek_files(gw_path, "matches.csv", columns=MATCH_COLS)
 
-    if not all_matches:
+    if not gw_files:
         return pd.DataFrame()
 
-    combined = pd.concat(all_matches, ignore_index=True)
+    combined = stack_gameweeks(gw_files, season, add_gw=False)
     print(f"  Loaded {len(combined)} matches from {season}")
 
     return combined
@@ -82,23 +233,12 @@ def load_matches_with_team_xg(season='2025-2026'):
 def load_player_match_stats(season='2025-2026'):
     gw_path = DATA_PATH / season / "By Gameweek"
 
-    all_stats = []
-    gw_folders = sorted([f for f in os.listdir(gw_path) if f.startswith('GW')])
-
-    for gw_folder in gw_folders:
-        gw_num = int(gw_folder.replace('GW', ''))
-        stats_file = gw_path / gw_folder / "playermatchstats.csv"
-
-        if stats_file.exists():
-            stats_df = pd.read_csv(stats_file)
-            stats_df['gw'] = gw_num
-            stats_df['season'] = season
-            all_stats.append(stats_df)
+    gw_files = read_gameweek_files(gw_path, "playermatchstats.csv")
 
-    if not all_stats:
+    if not gw_files:
         return pd.DataFrame()
 
-    combined = pd.concat(all_stats, ignore_index=True)
+    combined = stack_gameweeks(gw_files, season)
     print(f"  Loaded {len(combined)} player-match records from {season}")
 
     return combined
@@ -113,70 +253,102 @@ def load_players(season='2025-2026'):
         print(f"  Warning: players.csv not found for {season}")
         return pd.DataFrame()
 
-    players = pd.read_csv(players_path)
+    players = read_csv_cached(players_path)
     print(f"  Loaded {len(players)} players from {season}")
 
     return players
 
 
 def calculate_team_stats(matches_df, teams_df):
-    team_stats = {}
+    # The loaders return a bare DataFrame() when a file is missing: no teams
+    # means no rows, no matches means every team gets the no-match defaults
+    if teams_df.empty:
+        return pd.DataFrame(columns=TEAM_STATS_COLUMNS)
+    if matches_df.empty:
+        matches_df = pd.DataFrame({col: pd.Series(dtype=float) for col in MATCH_COLS})
+
+    home_agg = matches_df.groupby('home_team').agg(
+        xg_for_home=('home_expected_goals_xg', 'mean'),
+        xg_against_home=('away_expected_goals_xg', 'mean'),
+        n_home=('home_team', 'size'),
+    )
+    away_agg = matches_df.groupby('away_team').agg(
+        xg_for_away=('away_expected_goals_xg', 'mean'),
+        xg_against_away=('home_expected_goals_xg', 'mean'),
+        n_away=('away_team', 'size'),
+    )
 
-    for _, team in teams_df.iterrows():
-        team_id = team['id']
-        team_name = team['name']
+    team_stats = teams_df[[
+        'id', 'name', 'elo',
+        'strength_attack_home', 'strength_attack_away',
+        'strength_defence_home', 'strength_defence_away',
+    ]].rename(columns={'id': 'team_id', 'name': 'team_name'})
+    team_stats = team_stats.merge(home_agg, left_on='team_id', right_index=True, how='left')
+    team_stats = team_stats.merge(away_agg, left_on='team_id', right_index=True, how='left')
+
+    n_home = team_stats['n_home'].fillna(0)
+    n_away = team_stats['n_away'].fillna(0)
+
+    for col in ['xg_for_home', 'xg_against_home']:
+        team_stats[col] = team_stats[col].where(n_home > 0, 0)
+    for col in ['xg_for_away', 'xg_against_away']:
+        team_stats[col] = team_stats[col].where(n_away > 0, 0)
+
+    total_matches = n_home + n_away
+    has_matches = total_matches > 0
+    denom = total_matches.where(has_matches, 1)
+
+    team_stats['avg_xg_for'] = np.where(
+        has_matches,
+        (team_stats['xg_for_home'] * n_home + team_stats['xg_for_away'] * n_away) / denom,
+        1.3,
+    )
+    team_stats['avg_xg_against'] = np.where(
+        has_matches,
+        (team_stats['xg_against_home'] * n_home + team_stats['xg_against_away'] * n_away) / denom,
+        1.3,
+    )
 
-        home_matches = matches_df[matches_df['home_team'] == team_id]
-        away_matches = matches_df[matches_df['away_team'] == team_id]
+    return team_stats[TEAM_STATS_COLUMNS].reset_index(drop=True)
 
-        xg_for_home = home_matches['home_expected_goals_xg'].mean() if len(home_matches) > 0 else 0
-        xg_for_away = away_matches['away_expected_goals_xg'].mean() if len(away_matches) > 0 else 0
-        xg_against_home = home_matches['away_expected_goals_xg'].mean() if len(home_matches) > 0 else 0
-        xg_against_away = away_matches['home_expected_goals_xg'].mean() if len(away_matches) > 0 else 0
 
-        total_matches = len(home_matches) + len(away_matches)
+def group_starts(ids):
+    # Index of the first row of each row's group, for rows already sorted by id
+    n = len(ids)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = ids[1:] != ids[:-1]
+    return np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
 
-        if total_matches > 0:
-            avg_xg_for = (xg_for_home * len(home_matches) + xg_for_away * len(away_matches)) / total_matches
-            avg_xg_against = (xg_against_home * len(home_matches) + xg_against_away * len(away_matches)) / total_matches
-        else:
-            avg_xg_for = 1.3
-            avg_xg_against = 1.3
-
-        team_stats[team_id] = {
-            'team_id': team_id,
-            'team_name': team_name,
-            'elo': team['elo'],
-            'avg_xg_for': avg_xg_for,
-            'avg_xg_against': avg_xg_against,
-            'xg_for_home': xg_for_home,
-            'xg_for_away': xg_for_away,
-            'xg_against_home': xg_against_home,
-            'xg_against_away': xg_against_away,
-            'strength_attack_home': team['strength_attack_home'],
-            'strength_attack_away': team['strength_attack_away'],
-            'strength_defence_home': team['strength_defence_home'],
-            'strength_defence_away': team['strength_defence_away'],
-        }
-
-    return pd.DataFrame(team_stats.values())
 
+def shifted_rolling_mean(values, starts, window):
+    # Equivalent to groupby(ids).rolling(window, min_periods=1).mean().shift(1),
+    # computed in one pass from cumulative sums
+    idx = np.arange(len(values))
+    window_start = np.maximum(starts, idx - window)
 
-def calculate_rolling_form(player_gw_df, window=6):
-    df = player_gw_df.copy()
-    df = df.sort_values(['id', 'season', 'gw'])
+    valid = ~np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    nobs = np.concatenate(([0], np.cumsum(valid)))
 
-    df[f'last_{window}_avg_points'] = df.groupby('id')['event_points'].transform(
-        lambda x: x.rolling(window, min_periods=1).mean().shift(1)
-    )
+    total = csum[idx] - csum[window_start]
+    count = nobs[idx] - nobs[window_start]
 
-    df[f'last_{window}_avg_minutes'] = df.groupby('id')['minutes'].transform(
-        lambda x: x.rolling(window, min_periods=1).mean().shift(1)
-    )
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
 
-    df['last_3_avg_points'] = df.groupby('id')['event_points'].transform(
-        lambda x: x.rolling(3, min_periods=1).mean().shift(1)
-    )
+
+def calculate_rolling_form(player_gw_df, window=6):
+    # sort_values already returns a new frame, so the caller's is untouched
+    df = player_gw_df.sort_values(['id', 'season', 'gw'])
+
+    # Sort once and find the player boundaries once; every window reuses them
+    starts = group_starts(df['id'].to_numpy())
+    points = df['event_points'].to_numpy(dtype=np.float64)
+    minutes = df['minutes'].to_numpy(dtype=np.float64)
+
+    df[f'last_{window}_avg_points'] = shifted_rolling_mean(points, starts, window)
+    df[f'last_{window}_avg_minutes'] = shifted_rolling_mean(minutes, starts, window)
+    df['last_3_avg_points'] = shifted_rolling_mean(points, starts, 3)
 
     df['form_trend'] = df['last_3_avg_points'] - df[f'last_{window}_avg_points']
 
@@ -189,11 +361,15 @@ def calculate_rolling_form(player_gw_df, window=6):
 
 
 def prepare_training_data(player_gw_df, teams_df, matches_df, players_df):
-    df = player_gw_df.copy()
-
     team_stats = calculate_team_stats(matches_df, teams_df)
 
-    df = calculate_rolling_form(df, window=6)
+    # process_data already adds the rolling features; only compute them
+    # when called on raw gameweek rows. Nothing below mutates df before
+    # dropna hands back a new frame, so no defensive copy is needed
+    if 'last_6_avg_points' in player_gw_df.columns:
+        df = player_gw_df
+    else:
+        df = calculate_rolling_form(player_gw_df, window=6)
 
     feature_columns = [
         'last_6_avg_points',
@@ -219,7 +395,19 @@ def prepare_training_data(player_gw_df, teams_df, matches_df, players_df):
     return X, y, df_clean
 
 
-def process_data(seasons=None, save_processed=True):
+def concat_seasons(frames):
+    frames = [df for df in frames if len(df) > 0]
+    if not frames:
+        return pd.DataFrame()
+    return concat_frames(frames)
+
+
+def process_data(seasons=None, save_processed=True, save_format='parquet'):
+    # Check up front rather than after the whole pipeline has run;
+    # load_processed_data only looks for these two files
+    if save_format not in SAVE_FORMATS:
+        raise ValueError(f"save_format must be one of {SAVE_FORMATS}, got {save_format!r}")
+
     if seasons is None:
         seasons = ['2025-2026']
 
@@ -228,21 +416,24 @@ def process_data(seasons=None, save_processed=True):
     print("=" * 60)
 
     all_data = []
+    all_teams = []
+    all_matches = []
+    all_players = []
 
     for season in seasons:
         print(f"\n--- Processing {season} ---")
 
         print("\n1. Loading teams with Elo ratings...")
-        teams = load_teams_with_elo(season)
+        all_teams.append(load_teams_with_elo(season))
 
         print("\n2. Loading player gameweek stats...")
         player_gw = load_player_gameweek_stats(season)
 
         print("\n3. Loading matches with team xG...")
-        matches = load_matches_with_team_xg(season)
+        all_matches.append(load_matches_with_team_xg(season))
 
         print("\n4. Loading player info...")
-        players = load_players(season)
+        all_players.append(load_players(season))
 
         if len(player_gw) > 0:
             all_data.append(player_gw)
@@ -250,7 +441,7 @@ def process_data(seasons=None, save_processed=True):
     if not all_data:
         raise ValueError("No data loaded!")
 
-    combined = pd.concat(all_data, ignore_index=True)
+    combined = concat_frames(all_data)
     print(f"\n--- Combined Data ---")
     print(f"  Total records: {len(combined)}")
 
@@ -260,9 +451,9 @@ def process_data(seasons=None, save_processed=True):
     print("\n6. Preparing training data...")
     X, y, df_clean = prepare_training_data(
         df_processed,
-        teams if 'teams' in dir() else pd.DataFrame(),
-        matches if 'matches' in dir() else pd.DataFrame(),
-        players if 'players' in dir() else pd.DataFrame()
+        concat_seasons(all_teams),
+        concat_seasons(all_matches),
+        concat_seasons(all_players)
     )
 
     if X is not None:
@@ -271,8 +462,11 @@ def process_data(seasons=None, save_processed=True):
         print(f"  Target mean: {y.mean():.2f}, std: {y.std():.2f}")
 
     if save_processed:
-        output_path = Path(__file__).parent / "processed_data.csv"
-        df_clean.to_csv(output_path, index=False)
+        output_path = Path(__file__).parent / f"processed_data.{save_format}"
+        if save_format == 'parquet':
+            df_clean.to_parquet(output_path, engine="pyarrow", compression="zstd", index=False)
+        else:
+            df_clean.to_csv(output_path, index=False)
         print(f"\n✓ Saved processed data to: {output_path}")
 
     print("\n" + "=" * 60)
@@ -1,15 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Dict, Optional, Any
 import uvicorn
+import orjson
+import asyncio
 import os
 import shutil
 import subprocess
+from starlette.concurrency import run_in_threadpool
 from data.data_processor import process_data
 from ml.baseline_models import compare_models
 
-from ml.predictor import predict_players, get_predictor
+from ml.predictor import predict_players, get_predictor, predictor_ready, prediction_cache
 from optimization.team_optimizer import optimize_squad, optimize_with_starting_eleven
 
 
@@ -41,6 +45,11 @@ class OptimizeRequest(BaseModel):
     include_starting_eleven: bool = False
 
 
+class OptimizeOptions(BaseModel):
+    budget: float = 100.0
+    include_starting_eleven: bool = False
+
+
 class OptimizeResponse(BaseModel):
     squad: List[Dict]
     total_cost: float
@@ -57,6 +66,7 @@ class HealthResponse(BaseModel):
     status: str
     message: str
     version: str
+    prediction_cache: Optional[Dict[str, Any]] = None
 
 
 app = FastAPI(
@@ -64,9 +74,39 @@ app = FastAPI(
     description="Machine Learning predictions and squad optimization for Fantasy Premier League",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
+app.state.prediction_cache = prediction_cache
+
+
+# Player maps from the server carry the full FPL element plus fixtures, and the
+# optimizer hands them back untouched, so decode the body with orjson and only
+# check its shape instead of running the pydantic validator over every dict.
+# The request models still describe the body in the OpenAPI schema.
+def json_body_schema(model) -> Dict[str, Any]:
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": model.model_json_schema()}}
+        }
+    }
+
+
+async def read_players_body(request: Request) -> Dict[str, Any]:
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    
+    players = body.get('players') if isinstance(body, dict) else None
+    if not isinstance(players, list) or not all(isinstance(p, dict) for p in players):
+        raise HTTPException(status_code=422, detail="'players' must be a list of objects")
+    
+    return body
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -76,6 +116,11 @@ app.add_middleware(
 )
 
 
+def warm_predictor():
+    predictor = get_predictor()
+    print(f"✓ Service ready with {len(predictor.player_history)} players loaded")
+
+
 @app.on_event("startup")
 async def startup_event():
     print("Starting FPL ML Service...")
@@ -105,12 +150,20 @@ async def startup_event():
         print(f"Data update failed: {e}")
         print("  - Continuing with existing/fallback data if available.")
 
-    predictor = get_predictor()
-    print(f"✓ Service ready with {len(predictor.player_history)} players loaded")
+    # Load the predictor in the background so /health answers immediately;
+    # requests that need it wait on get_predictor() until it is ready
+    app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warm_predictor))
 
 
 @app.get("/health", response_model=HealthResponse)
 def health_check():
+    if not predictor_ready():
+        return HealthResponse(
+            status="ok",
+            message="FPL ML Service running! Model: loading",
+            version="1.0.0"
+        )
+    
     predictor = get_predictor()
     player_count = len(predictor.player_history)
     model_loaded = predictor.model is not None
@@ -118,15 +171,24 @@ def health_check():
     return HealthResponse(
         status="ok",
         message=f"FPL ML Service running! Model: {'loaded' if model_loaded else 'not loaded'}, Players: {player_count}",
-        version="1.0.0"
+        version="1.0.0",
+        prediction_cache=app.state.prediction_cache.stats()
     )
 
 
-@app.post("/predict", response_model=PredictionResponse)
-def predict_points(request: PredictionRequest):
+# Predictions are already plain str -> float, so skip response_model
+# validation and serialize straight through orjson; PredictionResponse is
+# kept only to document the schema
+@app.post(
+    "/predict",
+    responses={200: {"model": PredictionResponse}},
+    openapi_extra=json_body_schema(PredictionRequest)
+)
+async def predict_points(body: Dict[str, Any] = Depends(read_players_body)):
+    # Stays in this process so the loaded model and prediction cache are shared
     try:
-        predictions = predict_players(request.players)
-        return PredictionResponse(predictions=predictions)
+        predictions = await run_in_threadpool(predict_players, body['players'])
+        return ORJSONResponse({"predictions": predictions})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -148,13 +210,27 @@ def get_player_stats(player_id: int):
     }
 
 
-@app.post("/optimize/squad", response_model=OptimizeResponse)
-def optimize_squad_endpoint(request: OptimizeRequest):
+@app.post(
+    "/optimize/squad",
+    response_model=OptimizeResponse,
+    openapi_extra=json_body_schema(OptimizeRequest)
+)
+async def optimize_squad_endpoint(body: Dict[str, Any] = Depends(read_players_body)):
+    # Only the scalar options go through pydantic, with the same lax coercion
+    # as before ("100" -> 100.0, "true" -> True); the players stay raw dicts
     try:
-        if request.include_starting_eleven:
-            result = optimize_with_starting_eleven(request.players, request.budget)
-        else:
-            result = optimize_squad(request.players, request.budget)
+        options = OptimizeOptions.model_validate(
+            {key: body[key] for key in OptimizeOptions.model_fields if key in body}
+        )
+    except ValidationError as e:
+        errors = [{**error, 'loc': ['body', *error['loc']]} for error in e.errors(include_url=False)]
+        raise HTTPException(status_code=422, detail=errors)
+    
+    optimize = optimize_with_starting_eleven if options.include_starting_eleven else optimize_squad
+    try:
+        # The solve runs in this process, so replayed requests hit the
+        # optimizer's result cache; the threadpool keeps the event loop free
+        result = await run_in_threadpool(optimize, body['players'], options.budget)
         
         return OptimizeResponse(
             squad=result.get('squad', []),
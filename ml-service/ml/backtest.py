@@ -1,12 +1,21 @@
-import pandas as pd
+import sys
 import numpy as np
-from sklearn.linear_model import Ridge
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from pathlib import Path
-import os
+
+# Run as a script (python ml/backtest.py) only ml/ is on the path; add the
+# service root so the shared data package resolves as it does under main.py
+if __package__ in (None, ''):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data.data_processor import (
+    group_starts, shifted_rolling_mean, read_gameweek_files, stack_gameweeks
+)
 
 DATA_PATH = Path(__file__).parent.parent / "data" / "raw" / "FPL-Elo-Insights"
 
+BACKTEST_COLS = ('id', 'event_points', 'minutes')
+
 
 def load_season_data(season='2025-2026'):
     gw_path = DATA_PATH / "data" / season / "By Gameweek"
@@ -15,36 +24,29 @@ def load_season_data(season='2025-2026'):
         print(f"Data not found at {gw_path}")
         return None
     
-    all_data = []
-    gw_folders = sorted([f for f in os.listdir(gw_path) if f.startswith('GW')])
-    
-    for gw_folder in gw_folders:
-        stats_file = gw_path / gw_folder / "player_gameweek_stats.csv"
-        if stats_file.exists():
-            df = pd.read_csv(stats_file)
-            df['gw'] = int(gw_folder.replace('GW', ''))
-            all_data.append(df)
+    gw_files = read_gameweek_files(
+        gw_path, "player_gameweek_stats.csv", columns=BACKTEST_COLS
+    )
     
-    if not all_data:
+    if not gw_files:
         return None
     
-    combined = pd.concat(all_data, ignore_index=True)
+    combined = stack_gameweeks(gw_files, season)
     return combined.sort_values(['id', 'gw'])
 
 
 def prepare_features(df):
-    df = df.copy()
     df = df.sort_values(['id', 'gw'])
     
-    df['last_3_avg_points'] = df.groupby('id')['event_points'].transform(
-        lambda x: x.rolling(3, min_periods=1).mean().shift(1)
-    )
-    df['last_6_avg_points'] = df.groupby('id')['event_points'].transform(
-        lambda x: x.rolling(6, min_periods=1).mean().shift(1)
-    )
-    df['last_3_avg_minutes'] = df.groupby('id')['minutes'].transform(
-        lambda x: x.rolling(3, min_periods=1).mean().shift(1)
-    )
+    starts = group_starts(df['id'].to_numpy())
+    points = df['event_points'].to_numpy(dtype=np.float64)
+    minutes = df['minutes'].to_numpy(dtype=np.float64)
+    
+    # The loaded columns are already int16/int32/int8; keep the derived
+    # features at float32 too so the fill/clip passes move half the bytes
+    df['last_3_avg_points'] = shifted_rolling_mean(points, starts, 3).astype(np.float32)
+    df['last_6_avg_points'] = shifted_rolling_mean(points, starts, 6).astype(np.float32)
+    df['last_3_avg_minutes'] = shifted_rolling_mean(minutes, starts, 3).astype(np.float32)
     
     df['form_trend'] = df['last_3_avg_points'] - df['last_6_avg_points']
     
@@ -57,6 +59,35 @@ def prepare_features(df):
     return df
 
 
+class RidgeMoments:
+    # Sufficient statistics for Ridge(alpha, fit_intercept=True): solving
+    # the centred normal equations from these gives the same coefficients
+    # as refitting sklearn's Ridge on every row seen so far
+    
+    def __init__(self, n_features):
+        self.n = 0
+        self.sum_x = np.zeros(n_features)
+        self.sum_y = 0.0
+        self.xtx = np.zeros((n_features, n_features))
+        self.xty = np.zeros(n_features)
+    
+    def update(self, X, y):
+        self.n += len(X)
+        self.sum_x += X.sum(axis=0)
+        self.sum_y += y.sum()
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+    
+    def solve(self, alpha=1.0):
+        mean_x = self.sum_x / self.n
+        mean_y = self.sum_y / self.n
+        sxx = self.xtx - self.n * np.outer(mean_x, mean_x)
+        sxy = self.xty - self.n * mean_x * mean_y
+        coef = np.linalg.solve(sxx + alpha * np.eye(len(mean_x)), sxy)
+        intercept = mean_y - mean_x @ coef
+        return coef, intercept
+
+
 def run_backtest(min_train_weeks=4):
     print("=" * 60)
     print("BACKTEST: Walk-Forward Validation")
@@ -88,46 +119,65 @@ def run_backtest(min_train_weeks=4):
     print(f"   Testing on GW {min_train_weeks + 1} onwards\n")
     
     results = []
-    all_predictions = []
-    all_actuals = []
     
-    for test_gw in gameweeks[min_train_weeks:]:
-        train_data = df[df['gw'] < test_gw]
-        test_data = df[df['gw'] == test_gw]
+    # Order rows by gameweek so every test week is a contiguous slice
+    df = df.sort_values('gw', kind='stable')
+    X_all = df[feature_cols].to_numpy(dtype=np.float64)
+    y_all = df[target_col].to_numpy(dtype=np.float64)
+    gw_all = df['gw'].to_numpy()
+    
+    bounds = np.searchsorted(gw_all, gameweeks + [gameweeks[-1] + 1], side='left')
+    first_test = bounds[min_train_weeks]
+    
+    all_predictions = np.empty(len(gw_all) - first_test)
+    all_actuals = np.empty(len(gw_all) - first_test)
+    offset = 0
+    
+    # Walk-forward training sets only ever grow by the gameweek just tested,
+    # so keep running moments and re-solve the small Ridge system each week
+    moments = RidgeMoments(len(feature_cols))
+    moments.update(X_all[:first_test], y_all[:first_test])
+    
+    for i in range(min_train_weeks, len(gameweeks)):
+        test_gw = gameweeks[i]
+        X_test = X_all[bounds[i]:bounds[i + 1]]
+        y_test = y_all[bounds[i]:bounds[i + 1]]
+        train_size = moments.n
         
-        if len(train_data) == 0 or len(test_data) == 0:
+        if train_size == 0 or len(X_test) == 0:
+            moments.update(X_test, y_test)
             continue
         
-        X_train = train_data[feature_cols]
-        y_train = train_data[target_col]
-        X_test = test_data[feature_cols]
-        y_test = test_data[target_col]
+        coef, intercept = moments.solve(alpha=1.0)
+        predictions = X_test @ coef + intercept
+        moments.update(X_test, y_test)
         
-        model = Ridge(alpha=1.0)
-        model.fit(X_train, y_train)
-        
-        predictions = model.predict(X_test)
-        
-        rmse = np.sqrt(mean_squared_error(y_test, predictions))
-        mae = mean_absolute_error(y_test, predictions)
+        errors = predictions - y_test
+        rmse = np.sqrt(np.mean(errors ** 2))
+        mae = np.mean(np.abs(errors))
         
         results.append({
             'gameweek': test_gw,
-            'train_size': len(train_data),
-            'test_size': len(test_data),
+            'train_size': train_size,
+            'test_size': len(X_test),
             'rmse': rmse,
             'mae': mae
         })
         
-        all_predictions.extend(predictions)
-        all_actuals.extend(y_test.values)
+        n = len(X_test)
+        all_predictions[offset:offset + n] = predictions
+        all_actuals[offset:offset + n] = y_test
+        offset += n
         
-        print(f"   GW{test_gw}: RMSE={rmse:.2f}, MAE={mae:.2f} (tested on {len(test_data)} players)")
+        print(f"   GW{test_gw}: RMSE={rmse:.2f}, MAE={mae:.2f} (tested on {len(X_test)} players)")
     
     print("\n" + "=" * 60)
     print("OVERALL RESULTS")
     print("=" * 60)
     
+    all_predictions = all_predictions[:offset]
+    all_actuals = all_actuals[:offset]
+    
     overall_rmse = np.sqrt(mean_squared_error(all_actuals, all_predictions))
     overall_mae = mean_absolute_error(all_actuals, all_predictions)
     overall_r2 = r2_score(all_actuals, all_predictions)
@@ -2,9 +2,11 @@
 Baseline ML Models for FPL Points Prediction
 """
 
+import copy
 import numpy as np
 import pandas as pd
 import joblib
+from joblib import Parallel, delayed
 from pathlib import Path
 from sklearn.linear_model import LinearRegression, Ridge
 from sklearn.model_selection import train_test_split, cross_val_score
@@ -16,17 +18,30 @@ from sklearn.preprocessing import StandardScaler
 MODELS_PATH = Path(__file__).parent.parent / "models"
 MODELS_PATH.mkdir(exist_ok=True)
 
+# joblib.load detects the compression, so existing uncompressed pickles still load
+MODEL_COMPRESS = ('zlib', 3)
+
 
 def load_processed_data():
-    data_path = Path(__file__).parent.parent / "data" / "processed_data.csv"
+    data_dir = Path(__file__).parent.parent / "data"
+    
+    # process_data writes parquet by default; fall back to an older CSV export
+    candidates = [
+        path for path in (data_dir / "processed_data.parquet", data_dir / "processed_data.csv")
+        if path.exists()
+    ]
     
-    if not data_path.exists():
+    if not candidates:
         raise FileNotFoundError(
-            f"Processed data not found at {data_path}. "
+            f"Processed data not found at {data_dir / 'processed_data.parquet'}. "
             "Run data_processor.py first!"
         )
     
-    df = pd.read_csv(data_path)
+    data_path = max(candidates, key=lambda path: path.stat().st_mtime)
+    if data_path.suffix == '.parquet':
+        df = pd.read_parquet(data_path)
+    else:
+        df = pd.read_csv(data_path)
     
     # Feature columns (same as in data_processor.py)
     feature_columns = [
@@ -103,18 +118,13 @@ def train_linear_regression(X, y, model_name='linear_regression'):
     
     # Save the model
     model_path = MODELS_PATH / f"{model_name}.pkl"
-    joblib.dump(model, model_path)
+    joblib.dump(model, model_path, compress=MODEL_COMPRESS)
     print(f"\n✓ Model saved to: {model_path}")
     
     return model, metrics
 
 
-def train_ridge_regression(X, y, alpha=1.0, model_name='ridge_regression'):
-    
-    print(f"\n{'='*50}")
-    print(f"Training Ridge Regression (α={alpha})")
-    print(f"{'='*50}")
-    
+def split_and_scale(X, y):
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.3, random_state=42
     )
@@ -124,6 +134,24 @@ def train_ridge_regression(X, y, alpha=1.0, model_name='ridge_regression'):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
+    return X_train_scaled, X_test_scaled, y_train, y_test, scaler
+
+
+def fuse_scaler(model, scaler):
+    # Fold the standardization into the coefficients so the saved model
+    # predicts straight from raw features without a separate scaler
+    fused = copy.copy(model)
+    fused.coef_ = model.coef_ / scaler.scale_
+    fused.intercept_ = model.intercept_ - np.dot(model.coef_, scaler.mean_ / scaler.scale_)
+    return fused
+
+
+def fit_scaled_ridge(X_train_scaled, X_test_scaled, y_train, y_test, scaler, alpha, model_name):
+    
+    print(f"\n{'='*50}")
+    print(f"Training Ridge Regression (α={alpha})")
+    print(f"{'='*50}")
+    
     # Train Ridge model
     model = Ridge(alpha=alpha)
     model.fit(X_train_scaled, y_train)
@@ -147,13 +175,21 @@ def train_ridge_regression(X, y, alpha=1.0, model_name='ridge_regression'):
     print(f"MAE: {mae:.3f}")
     print(f"R²: {r2:.3f}")
     
-    # Save model and scaler together
+    # Save with the scaler fused in; it takes unscaled features
     model_path = MODELS_PATH / f"{model_name}.pkl"
-    scaler_path = MODELS_PATH / f"{model_name}_scaler.pkl"
-    joblib.dump(model, model_path)
-    joblib.dump(scaler, scaler_path)
+    joblib.dump(fuse_scaler(model, scaler), model_path, compress=MODEL_COMPRESS)
     print(f"\n✓ Model saved to: {model_path}")
     
+    return model, metrics
+
+
+def train_ridge_regression(X, y, alpha=1.0, model_name='ridge_regression'):
+    X_train_scaled, X_test_scaled, y_train, y_test, scaler = split_and_scale(X, y)
+    
+    model, metrics = fit_scaled_ridge(
+        X_train_scaled, X_test_scaled, y_train, y_test, scaler, alpha, model_name
+    )
+    
     return model, metrics, scaler
 
 
@@ -169,20 +205,27 @@ def compare_models():
     print(f"Features: {features}")
     print(f"Target stats: mean={y.mean():.2f}, std={y.std():.2f}")
     
-    results = {}
-    
-    # Train Linear Regression
-    lr_model, lr_metrics = train_linear_regression(X, y)
-    results['linear_regression'] = lr_metrics
+    # The split and the scaler don't depend on alpha, so do them once and
+    # only refit the Ridge itself for each value
+    X_train_scaled, X_test_scaled, y_train, y_test, scaler = split_and_scale(X, y)
+    alphas = [0.1, 1.0, 10.0]
+    ridge_names = [f'ridge_alpha_{alpha}' for alpha in alphas]
+    
+    # Linear Regression and the Ridge alpha sweep are independent fits,
+    # so run them on separate cores
+    fitted = Parallel(n_jobs=-1, backend='loky', batch_size=1)(
+        [delayed(train_linear_regression)(X, y)] +
+        [
+            delayed(fit_scaled_ridge)(
+                X_train_scaled, X_test_scaled, y_train, y_test, scaler, alpha, model_name
+            )
+            for alpha, model_name in zip(alphas, ridge_names)
+        ]
+    )
     
-    # Train Ridge Regression with different alpha values
-    for alpha in [0.1, 1.0, 10.0]:
-        ridge_model, ridge_metrics, _ = train_ridge_regression(
-            X, y, 
-            alpha=alpha, 
-            model_name=f'ridge_alpha_{alpha}'
-        )
-        results[f'ridge_alpha_{alpha}'] = ridge_metrics
+    results = {'linear_regression': fitted[0][1]}
+    for model_name, (_, metrics) in zip(ridge_names, fitted[1:]):
+        results[model_name] = metrics
     
     # Summary
     print("\n" + "="*60)
@@ -1,8 +1,17 @@
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
 import joblib
 import subprocess
 import os
+import threading
+import time
+import hashlib
+import orjson
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
@@ -10,6 +19,70 @@ from typing import Dict, List, Any, Optional
 MODELS_PATH = Path(__file__).parent.parent / "models"
 DATA_PATH = Path(__file__).parent.parent / "data"
 ELO_INSIGHTS_PATH = DATA_PATH / "raw" / "FPL-Elo-Insights"
+PULL_INTERVAL = 3600
+# Bump whenever the history computation in _load_player_history changes, so
+# caches written by older code are rebuilt instead of served
+HISTORY_CACHE_VERSION = 3
+
+HISTORY_COLS = ('id', 'gw', 'event_points', 'minutes', 'web_name')
+HISTORY_FEATURES = ('last_6_avg_points', 'last_3_avg_points', 'form_trend', 'last_6_avg_minutes')
+LIVE_FEATURES = (('form', 0), ('now_cost', 50), ('selected_by_percent', 0))
+# Points and minutes feed float sums, so they are read as floats and
+# accept files that write them as decimals ("6.0")
+HISTORY_TYPES = {'id': pa.int32(), 'gw': pa.int8(), 'event_points': pa.float64(), 'minutes': pa.float64()}
+
+
+def read_history_table(path: Path, gw: int) -> pa.Table:
+    # Arrow's multi-threaded reader parses only the columns the rolling
+    # stats need; blank numeric cells become nulls instead of failing
+    def read(column_types):
+        return pv.read_csv(
+            path,
+            read_options=pv.ReadOptions(use_threads=True),
+            convert_options=pv.ConvertOptions(
+                include_columns=list(HISTORY_COLS),
+                include_missing_columns=True,
+                column_types=column_types
+            )
+        )
+    
+    try:
+        table = read(HISTORY_TYPES)
+    except pa.ArrowInvalid:
+        # Ids or weeks written as decimals ("12.0") don't parse as ints;
+        # read every numeric column as float and narrow afterwards
+        table = read({name: pa.float64() for name in HISTORY_TYPES})
+        for name, dtype in HISTORY_TYPES.items():
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, name, pc.cast(table.column(index), dtype))
+    # Older files without gw or web_name come back as all-null columns
+    missing = [name for name in table.column_names if table.column(name).null_count == table.num_rows]
+    table = table.drop_columns(missing)
+    
+    if 'gw' not in table.column_names:
+        table = table.append_column('gw', pa.array(np.full(table.num_rows, gw), type=HISTORY_TYPES['gw']))
+    return table
+
+
+def parse_floats(values: List[Any]):
+    # One C-level conversion for the whole column; only fall back to
+    # float() per value to find out which entries are malformed
+    try:
+        parsed = np.asarray(values, dtype=np.float64)
+        if parsed.ndim == 1:
+            return parsed, np.ones(len(parsed), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+    
+    parsed = np.full(len(values), np.nan)
+    ok = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            parsed[i] = float(value)
+            ok[i] = True
+        except (TypeError, ValueError):
+            pass
+    return parsed, ok
 
 
 def update_dataset():
@@ -46,11 +119,37 @@ def update_dataset():
         return True
 
 
+def start_dataset_update(min_interval: float = PULL_INTERVAL) -> Optional[threading.Thread]:
+    # Pull on a daemon thread so startup never waits on git; the refreshed
+    # CSVs are picked up by the next load. The sentinel's mtime records the
+    # last attempt so restarts within the interval don't pull again
+    sentinel = MODELS_PATH / ".last_pull"
+    if sentinel.exists() and time.time() - sentinel.stat().st_mtime < min_interval:
+        print("✓ Data pulled recently, skipping update")
+        return None
+    
+    def pull():
+        if update_dataset():
+            try:
+                MODELS_PATH.mkdir(exist_ok=True)
+                sentinel.touch()
+            except OSError as e:
+                print(f"⚠ Could not record last data pull: {e}")
+    
+    thread = threading.Thread(target=pull, name="dataset-update", daemon=True)
+    thread.start()
+    return thread
+
+
 class FPLPredictor:
     
     def __init__(self, auto_update=True):
         self.model = None
+        self._coef = None
+        self._intercept = 0.0
         self.player_history = {}
+        self._history_array = np.zeros((0, len(HISTORY_FEATURES)), dtype=np.float32)
+        self._has_history = np.zeros(0, dtype=bool)
         self.feature_columns = [
             'last_6_avg_points',
             'last_3_avg_points',
@@ -61,11 +160,13 @@ class FPLPredictor:
             'selected_by_percent',
         ]
         
-        if auto_update:
-            update_dataset()
-        
         self._load_model()
         self._load_player_history()
+        self._index_history()
+        
+        # Started after the CSVs are read so the pull can't rewrite them mid-load
+        if auto_update:
+            start_dataset_update()
     
     def _load_model(self):
         model_path = MODELS_PATH / "linear_regression.pkl"
@@ -77,6 +178,14 @@ class FPLPredictor:
             return
         
         self.model = joblib.load(model_path)
+        
+        # A linear model's predict is just X @ coef_ + intercept_, so keep
+        # those to skip sklearn's per-call input validation
+        coef = getattr(self.model, 'coef_', None)
+        if coef is not None and np.ndim(coef) == 1:
+            self._coef = np.asarray(coef, dtype=np.float64)
+            self._intercept = float(self.model.intercept_)
+        
         print(f"✓ Loaded prediction model")
     
     def _load_player_history(self):
@@ -89,109 +198,171 @@ class FPLPredictor:
             print(f"⚠ Gameweek data not found at {gw_path}")
             return
         
-        all_data = []
-        gw_folders = sorted([f for f in os.listdir(gw_path) if f.startswith('GW')])
-        
-        for gw_folder in gw_folders:
-            stats_file = gw_path / gw_folder / "player_gameweek_stats.csv"
-            if stats_file.exists():
-                df = pd.read_csv(stats_file)
-                if 'gw' not in df.columns:
-                    df['gw'] = int(gw_folder.replace('GW', ''))
-                all_data.append(df)
+        # One scandir pass and one stat per stats file; the stat is reused
+        # for the cache key and empty files are skipped before parsing
+        stats_files = []
+        with os.scandir(gw_path) as entries:
+            for entry in entries:
+                if not entry.name.startswith('GW') or not entry.is_dir():
+                    continue
+                stats_file = Path(entry.path) / "player_gameweek_stats.csv"
+                try:
+                    st = stats_file.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_size > 0:
+                    stats_files.append((entry.name, stats_file, st))
+        stats_files.sort(key=lambda f: int(f[0][2:]))
         
-        if not all_data:
+        if not stats_files:
             print("⚠ No gameweek data found")
             return
         
-        combined = pd.concat(all_data, ignore_index=True)
-        combined = combined.sort_values(['id', 'gw'])
+        # Key the cache on every source file's path, mtime and size, so an
+        # added, removed or rewritten gameweek each gives a different file,
+        # and on the format version so a change to the stats below does too
+        signature = hashlib.blake2b(
+            repr((
+                HISTORY_CACHE_VERSION,
+                [(str(f), st.st_mtime_ns, st.st_size) for _, f, st in stats_files]
+            )).encode(),
+            digest_size=16
+        ).hexdigest()
+        cache_path = MODELS_PATH / f"player_history_{signature}.parquet"
+        if cache_path.exists():
+            self.player_history = pd.read_parquet(cache_path).to_dict('index')
+            print(f"✓ Loaded cached rolling stats for {len(self.player_history)} players")
+            return
+        
+        # Concatenate and sort as Arrow tables and convert to pandas once;
+        # columns missing from some weeks are filled with nulls
+        tables = [
+            read_history_table(stats_file, int(gw_folder.replace('GW', '')))
+            for gw_folder, stats_file, _ in stats_files
+        ]
+        full = pa.concat_tables(tables, promote_options='default')
+        del tables
+        full = full.filter(pc.is_valid(full['id']))
+        full = full.sort_by([('id', 'ascending'), ('gw', 'ascending')])
+        combined = full.to_pandas(split_blocks=True, self_destruct=True)
+        del full
         
         print(f"  Loaded {len(combined)} records from GW1-{combined['gw'].max()}")
         
-        for player_id in combined['id'].unique():
-            player_df = combined[combined['id'] == player_id].sort_values('gw')
-            
-            if len(player_df) == 0:
-                continue
-            
-            latest = player_df.iloc[-1]
-            points = player_df['event_points'].values
-            minutes = player_df['minutes'].values
-            
-            last_6_points = points[-6:] if len(points) >= 1 else [2.0]
-            last_3_points = points[-3:] if len(points) >= 1 else [2.0]
-            last_6_minutes = minutes[-6:] if len(minutes) >= 1 else [60.0]
-            
-            self.player_history[int(player_id)] = {
-                'last_6_avg_points': float(np.mean(last_6_points)),
-                'last_3_avg_points': float(np.mean(last_3_points)),
-                'form_trend': float(np.mean(last_3_points) - np.mean(last_6_points)),
-                'last_6_avg_minutes': float(np.mean(last_6_minutes)),
-                'games_played': len(player_df),
-                'total_points': int(points.sum()),
-                'web_name': latest.get('web_name', ''),
-            }
+        # Rows are sorted by player, so each player is one contiguous run;
+        # every "mean of the latest n weeks" is a difference of cumulative sums
+        ids = combined['id'].to_numpy()
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        ends = np.append(starts[1:], len(ids))
+        
+        def running_totals(values):
+            # Blank cells are skipped rather than poisoning every later player
+            valid = ~np.isnan(values)
+            csum = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+            count = np.concatenate(([0], np.cumsum(valid)))
+            return csum, count
+        
+        def latest_mean(totals, n):
+            csum, count = totals
+            window_start = np.maximum(starts, ends - n)
+            observed = count[ends] - count[window_start]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(observed > 0, (csum[ends] - csum[window_start]) / observed, np.nan)
+        
+        points = running_totals(combined['event_points'].to_numpy(dtype=np.float64))
+        minutes = running_totals(combined['minutes'].to_numpy(dtype=np.float64))
+        
+        last_6_avg_points = latest_mean(points, 6)
+        last_3_avg_points = latest_mean(points, 3)
+        
+        history = pd.DataFrame({
+            'last_6_avg_points': last_6_avg_points,
+            'last_3_avg_points': last_3_avg_points,
+            'form_trend': last_3_avg_points - last_6_avg_points,
+            'last_6_avg_minutes': latest_mean(minutes, 6),
+            'games_played': ends - starts,
+            'total_points': (points[0][ends] - points[0][starts]).round().astype(np.int64),
+            'web_name': combined['web_name'].to_numpy()[ends - 1] if 'web_name' in combined.columns else '',
+        }, index=ids[starts].astype(int))
+        self.player_history = history.to_dict('index')
         
         print(f"✓ Calculated rolling stats for {len(self.player_history)} players")
-    
-    def _extract_features(self, player: Dict[str, Any]) -> Optional[np.ndarray]:
+        
         try:
-            player_id = player.get('id')
-            if player_id is None:
-                return None
-            
-            player_id = int(player_id)
-            history = self.player_history.get(player_id, {})
-            
-            last_6_avg = history.get('last_6_avg_points', 2.0)
-            last_3_avg = history.get('last_3_avg_points', 2.0)
-            form_trend = history.get('form_trend', 0.0)
-            last_6_avg_minutes = history.get('last_6_avg_minutes', 60.0)
-            
-            form = float(player.get('form', 0) or 0)
-            now_cost = float(player.get('now_cost', 50) or 50)
-            selected_by = float(player.get('selected_by_percent', 0) or 0)
-            
-            if player_id not in self.player_history:
-                last_6_avg = form * 0.9
-                last_3_avg = form
-                form_trend = 0.0
-                last_6_avg_minutes = 60.0
-            
-            features = np.array([
-                last_6_avg,
-                last_3_avg,
-                form_trend,
-                last_6_avg_minutes,
-                form,
-                now_cost,
-                selected_by,
-            ])
-            
-            return features
-            
-        except Exception as e:
-            print(f"Error extracting features for player {player.get('id')}: {e}")
-            return None
+            MODELS_PATH.mkdir(exist_ok=True)
+            tmp_path = cache_path.with_suffix('.tmp')
+            history.to_parquet(tmp_path)
+            os.replace(tmp_path, cache_path)
+            for stale in MODELS_PATH.glob("player_history*.parquet"):
+                if stale != cache_path:
+                    stale.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"⚠ Could not cache player history: {e}")
+    
+    def _index_history(self):
+        # Player ids are small non-negative ints, so the historical features
+        # live in one array indexed by id rather than a dict per player
+        ids = np.fromiter(self.player_history.keys(), dtype=np.int64, count=len(self.player_history))
+        size = int(ids.max()) + 1 if len(ids) else 0
+        
+        self._history_array = np.zeros((size, len(HISTORY_FEATURES)), dtype=np.float32)
+        self._has_history = np.zeros(size, dtype=bool)
+        if size:
+            self._history_array[ids] = [
+                [history[name] for name in HISTORY_FEATURES]
+                for history in self.player_history.values()
+            ]
+            self._has_history[ids] = True
+    
+    def _known_players(self, ids: np.ndarray) -> np.ndarray:
+        known = (ids >= 0) & (ids < len(self._has_history))
+        known[known] = self._has_history[ids[known]]
+        return known
+    
+    def _build_features(self, players: List[Dict[str, Any]], ids: np.ndarray):
+        n_history = len(HISTORY_FEATURES)
+        X = np.empty((len(players), len(self.feature_columns)), dtype=np.float32)
+        valid = np.ones(len(players), dtype=bool)
+        
+        # Parse each live column in one go rather than a float() per player
+        for col, (key, default) in enumerate(LIVE_FEATURES, start=n_history):
+            values, ok = parse_floats([player.get(key, default) or default for player in players])
+            X[:, col] = values
+            valid &= ok
+        
+        known = self._known_players(ids)
+        X[known, :n_history] = self._history_array[ids[known]]
+        
+        # Players with no history fall back to their current form
+        new = ~known
+        form = X[new, n_history]
+        X[new, 0] = form * 0.9
+        X[new, 1] = form
+        X[new, 2] = 0.0
+        X[new, 3] = 60.0
+        
+        for row in np.flatnonzero(~valid):
+            print(f"Error extracting features for player {players[row].get('id')}: invalid numeric value")
+        
+        return X, valid
+    
+    def _predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        if self._coef is not None:
+            return X @ self._coef + self._intercept
+        return self.model.predict(X)
     
     def predict_single(self, player: Dict[str, Any]) -> float:
         if self.model is None:
             form = float(player.get('form', 0) or 0)
             return round(form * 1.2, 1)
         
-        features = self._extract_features(player)
-        
-        if features is None:
-            return 0.0
-        
-        prediction = self.model.predict([features])[0]
-        prediction = np.clip(prediction, 0, 25)
-        
-        return round(float(prediction), 1)
+        return self.predict_batch([player]).get(str(player.get('id')), 0.0)
     
     def predict_batch(self, players: List[Dict[str, Any]]) -> Dict[str, float]:
         predictions = {}
+        batch_rows = {}
+        batch_players = []
+        row_ids = []
         
         for player in players:
             player_id = player.get('id')
@@ -203,8 +374,30 @@ class FPLPredictor:
             if not player_id_str or player_id_str == 'None':
                 continue
             
-            predicted_points = self.predict_single(player)
-            predictions[player_id_str] = predicted_points
+            if self.model is None:
+                predictions[player_id_str] = self.predict_single(player)
+                continue
+            
+            predictions[player_id_str] = 0.0
+            batch_rows.pop(player_id_str, None)
+            
+            try:
+                row_id = int(player_id)
+            except (TypeError, ValueError, OverflowError) as e:
+                print(f"Error extracting features for player {player_id}: {e}")
+                continue
+            
+            batch_rows[player_id_str] = len(batch_players)
+            batch_players.append(player)
+            row_ids.append(row_id)
+        
+        if batch_players:
+            X, valid = self._build_features(batch_players, np.array(row_ids, dtype=np.int64))
+            batch_predictions = np.clip(self._predict_matrix(X), 0, 25)
+            
+            for player_id_str, row in batch_rows.items():
+                if valid[row]:
+                    predictions[player_id_str] = round(float(batch_predictions[row]), 1)
         
         return predictions
     
@@ -212,16 +405,94 @@ class FPLPredictor:
         return self.player_history.get(player_id, {})
 
 
-_predictor: Optional[FPLPredictor] = None
+_predictor_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _build_predictor() -> FPLPredictor:
+    return FPLPredictor(auto_update=True)
 
 
 def get_predictor() -> FPLPredictor:
-    global _predictor
-    if _predictor is None:
-        _predictor = FPLPredictor(auto_update=True)
-    return _predictor
+    # Requests that arrive while the background warm-up is still loading
+    # wait for it instead of building a second predictor
+    with _predictor_lock:
+        return _build_predictor()
+
+
+def predictor_ready() -> bool:
+    return _build_predictor.cache_info().currsize > 0
+
+
+# Bounded LRU of recent /predict results keyed by a hash of the payload; the
+# frontend re-posts the same player list while polling, so identical requests
+# within the TTL are answered without rebuilding features
+class PredictionCache:
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(players: List[Dict[str, Any]]) -> Optional[str]:
+        try:
+            payload = orjson.dumps(players, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return None
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: str, predictions: Dict[str, float]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), predictions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+prediction_cache = PredictionCache()
 
 
 def predict_players(players: List[Dict[str, Any]]) -> Dict[str, float]:
+    key = prediction_cache.make_key(players)
+    if key is not None:
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            return cached
+    
     predictor = get_predictor()
-    return predictor.predict_batch(players)
+    predictions = predictor.predict_batch(players)
+    
+    if key is not None:
+        prediction_cache.set(key, predictions)
+    return predictions
+
+
+# Opt-in load at import time for CLI scripts and pre-forking servers, so the
+# first call never pays for the model and history load
+if os.environ.get('FPL_EAGER_LOAD') == '1':
+    get_predictor()
@@ -2,6 +2,6 @@
 Optimization Module - Squad optimization using Linear Programming
 
 This module contains:
-- team_optimizer.py: PuLP-based squad optimization
+- team_optimizer.py: MIP squad optimization (HiGHS via scipy)
 """
 
@@ -1,5 +1,14 @@
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum, LpBinary, LpStatus, PULP_CBC_CMD
-from typing import List, Dict, Any, Optional
+import os
+import copy
+import hashlib
+import threading
+import orjson
+import numpy as np
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from scipy.optimize import milp, LinearConstraint, Bounds
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 
 POSITION_REQUIREMENTS = {
@@ -10,17 +19,37 @@ POSITION_REQUIREMENTS = {
 }
 
 POSITION_ORDER = list(POSITION_REQUIREMENTS.keys())
+POSITION_CODES = {position: code for code, position in enumerate(POSITION_ORDER)}
+
+POSITION_ALIASES = {
+    'GK': 'GKP',
+    'GKP': 'GKP',
+    'DEF': 'DEF',
+    'MID': 'MID',
+    'FWD': 'FWD',
+    'FW': 'FWD',
+}
+
+VALID_FORMATIONS = [
+    (3, 4, 3), (3, 5, 2), (4, 3, 3), (4, 4, 2), (4, 5, 1), (5, 3, 2), (5, 4, 1)
+]
 
 MAX_PLAYERS_PER_TEAM = 3
 SQUAD_SIZE = 15
 DEFAULT_BUDGET = 100.0
 
+# Predicted points are noisy, so stop once the incumbent is within 0.1% of
+# the best bound instead of proving exact optimality
+DEFAULT_MIP_GAP = 0.001
+SOLVER_TIME_LIMIT = 10
+
+SQUAD_CACHE_SIZE = 128
+
+PRICE_GRID_TOLERANCE = 1e-6
+
 
 def get_position_sort_index(position: str) -> int:
-    try:
-        return POSITION_ORDER.index(position)
-    except ValueError:
-        return len(POSITION_ORDER)
+    return POSITION_CODES.get(position, len(POSITION_ORDER))
 
 
 def get_player_team(player: Dict[str, Any]) -> str:
@@ -28,22 +57,303 @@ def get_player_team(player: Dict[str, Any]) -> str:
 
 
 def normalize_position(position: str) -> str:
-    position_aliases = {
-        'GK': 'GKP',
-        'GKP': 'GKP',
-        'DEF': 'DEF',
-        'MID': 'MID',
-        'FWD': 'FWD',
-        'FW': 'FWD',
-    }
-    return position_aliases.get(position, 'MID')
+    return POSITION_ALIASES.get(position, 'MID')
+
+
+def prune_dominated(
+    player_ids: List[Any],
+    player_lookup: Dict[Any, Dict[str, Any]],
+    keep: Optional[List[int]] = None
+) -> List[Any]:
+    # A squad holds at most `limit` players from one position and team, so a
+    # player beaten on both price and points by `limit` others from the same
+    # group is never needed: one of them is always free to swap in. Existing
+    # squad members stay, since swapping them out would cost a transfer
+    keep = set(keep or ())
+    groups = {}
+    for pid, player in player_lookup.items():
+        key = (normalize_position(player.get('position', 'MID')), get_player_team(player))
+        groups.setdefault(key, []).append(pid)
+    
+    survivors = set()
+    for (position, _), members in groups.items():
+        limit = min(MAX_PLAYERS_PER_TEAM, POSITION_REQUIREMENTS[position])
+        if len(members) <= limit:
+            survivors.update(members)
+            continue
+        
+        # Cheapest first, so everyone already kept costs no more than the
+        # current player and dominates them if they score at least as much
+        members.sort(key=lambda pid: (
+            player_lookup[pid].get('price', 0),
+            -player_lookup[pid].get('predicted_points', 0)
+        ))
+        kept_points = []
+        for pid in members:
+            points = player_lookup[pid].get('predicted_points', 0)
+            dominators = sum(1 for kept in kept_points if kept >= points)
+            if dominators >= limit and pid not in keep:
+                continue
+            kept_points.append(points)
+            survivors.add(pid)
+    
+    return [pid for pid in player_ids if pid in survivors]
+
+
+HIGHS_STATUS = {0: 'Optimal', 2: 'Infeasible', 3: 'Unbounded'}
+
+
+def player_arrays(
+    player_lookup: Dict[Any, Dict[str, Any]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    # Pull the fields the solvers need out of the player dicts in one pass,
+    # as parallel arrays in player_lookup order; teams are coded 0..n_teams-1
+    points = []
+    prices = []
+    position_codes = []
+    team_codes = []
+    teams = {}
+    for player in player_lookup.values():
+        points.append(player.get('predicted_points', 0))
+        prices.append(player.get('price', 0))
+        position_codes.append(POSITION_CODES[normalize_position(player.get('position', 'MID'))])
+        team_codes.append(teams.setdefault(get_player_team(player), len(teams)))
+    
+    return (
+        np.array(points, dtype=float),
+        np.array(prices, dtype=float),
+        np.array(position_codes, dtype=np.int64),
+        np.array(team_codes, dtype=np.int64),
+        len(teams)
+    )
+
+
+def price_units(prices: np.ndarray, budget: float) -> Tuple[np.ndarray, float]:
+    # FPL prices move in £0.1m steps, so counted in tenths the budget row is
+    # integer data with no float rounding to leave slack in; off-grid prices
+    # are left as they are
+    tenths = np.round(prices * 10)
+    if not np.allclose(prices * 10, tenths, rtol=0, atol=PRICE_GRID_TOLERANCE):
+        return prices, budget
+    return tenths, float(np.floor(budget * 10 + PRICE_GRID_TOLERANCE))
+
+
+def solve_with_highs(
+    player_ids: List[Any],
+    player_lookup: Dict[Any, Dict[str, Any]],
+    budget: float,
+    existing_squad: Optional[List[int]] = None,
+    max_transfers: Optional[int] = None,
+    gap: float = DEFAULT_MIP_GAP
+) -> Tuple[str, Set[Any]]:
+    # One binary column per distinct id; an id listed more than once counts
+    # that many times towards the squad, budget and every group limit
+    unique_ids = list(player_lookup)
+    multiplicity = Counter(player_ids)
+    n = len(unique_ids)
+    
+    weight = np.array([multiplicity[pid] for pid in unique_ids], dtype=float)
+    points, prices, position_codes, team_codes, n_teams = player_arrays(player_lookup)
+    prices, budget = price_units(prices, budget)
+    
+    # Rows: squad size, budget, one per position, one per team, transfers
+    n_positions = len(POSITION_ORDER)
+    A = np.zeros((2 + n_positions + n_teams + 1, n))
+    lb = np.full(A.shape[0], -np.inf)
+    ub = np.full(A.shape[0], np.inf)
+    columns = np.arange(n)
+    
+    A[0] = weight
+    lb[0] = ub[0] = SQUAD_SIZE
+    
+    A[1] = prices * weight
+    ub[1] = budget
+    
+    A[2 + position_codes, columns] = weight
+    for position, required in POSITION_REQUIREMENTS.items():
+        lb[2 + POSITION_CODES[position]] = ub[2 + POSITION_CODES[position]] = required
+    
+    A[2 + n_positions + team_codes, columns] = weight
+    ub[2 + n_positions:-1] = MAX_PLAYERS_PER_TEAM
+    
+    if existing_squad and max_transfers is not None:
+        existing_set = set(existing_squad)
+        kept = np.array([pid in existing_set for pid in unique_ids])
+        A[-1, kept] = weight[kept]
+        lb[-1] = weight[kept].sum() - max_transfers
+    
+    result = milp(
+        -points * weight,
+        constraints=LinearConstraint(A, lb, ub),
+        integrality=np.ones(n),
+        bounds=Bounds(0, 1),
+        options={'mip_rel_gap': gap, 'time_limit': SOLVER_TIME_LIMIT}
+    )
+    
+    # An incumbent found before the time limit counts as a solution; with
+    # the gap tolerance it is within noise of the optimum anyway
+    status = HIGHS_STATUS.get(result.status, 'Not Solved')
+    if result.status == 1 and result.x is not None:
+        status = 'Optimal'
+    if status != 'Optimal':
+        return status, set()
+    
+    return status, {pid for pid, x in zip(unique_ids, result.x) if x > 0.5}
+
+
+def solve_with_swaps(
+    player_ids: List[Any],
+    player_lookup: Dict[Any, Dict[str, Any]],
+    budget: float,
+    existing_squad: List[int],
+    max_transfers: int
+) -> Tuple[str, Set[Any]]:
+    # With a full existing squad and at most one transfer, the only feasible
+    # squads are the current one and its single swaps, so score every
+    # (out, in) pair at once instead of solving a MIP
+    unique_ids = list(player_lookup)
+    points, prices, position_codes, team_codes, n_teams = player_arrays(player_lookup)
+    prices, budget = price_units(prices, budget)
+    
+    existing_set = set(existing_squad)
+    in_squad = np.array([pid in existing_set for pid in unique_ids])
+    outs = np.flatnonzero(in_squad)
+    ins = np.flatnonzero(~in_squad)
+    
+    required = np.array([POSITION_REQUIREMENTS[position] for position in POSITION_ORDER])
+    position_counts = np.bincount(position_codes[outs], minlength=len(POSITION_ORDER))
+    team_counts = np.bincount(team_codes[outs], minlength=n_teams)
+    squad_points = points[outs].sum()
+    squad_cost = prices[outs].sum()
+    
+    best_points = -np.inf
+    chosen = None
+    if (squad_cost <= budget and (position_counts == required).all()
+            and (team_counts <= MAX_PLAYERS_PER_TEAM).all()):
+        best_points = squad_points
+        chosen = outs
+    
+    if max_transfers >= 1 and ins.size:
+        # Rows are players sold, columns players bought; counts after each
+        # swap are the squad's counts minus the seller's plus the buyer's
+        positions = np.eye(len(POSITION_ORDER), dtype=np.int64)
+        position_after = (
+            position_counts
+            - positions[position_codes[outs]][:, None, :]
+            + positions[position_codes[ins]][None, :, :]
+        )
+        team_ids = np.eye(n_teams, dtype=np.int64)
+        team_after = (
+            team_counts
+            - team_ids[team_codes[outs]][:, None, :]
+            + team_ids[team_codes[ins]][None, :, :]
+        )
+        feasible = (
+            (squad_cost - prices[outs][:, None] + prices[ins][None, :] <= budget)
+            & (position_after == required).all(axis=2)
+            & (team_after <= MAX_PLAYERS_PER_TEAM).all(axis=2)
+        )
+        swap_points = np.where(
+            feasible,
+            squad_points - points[outs][:, None] + points[ins][None, :],
+            -np.inf
+        )
+        out_index, in_index = np.unravel_index(np.argmax(swap_points), swap_points.shape)
+        if swap_points[out_index, in_index] > best_points:
+            chosen = np.append(np.delete(outs, out_index), ins[in_index])
+    
+    if chosen is None:
+        return 'Infeasible', set()
+    
+    return 'Optimal', {unique_ids[i] for i in chosen}
+
+
+# Results of recent solves, keyed on the full request, so a replayed pool
+# skips the solve. The cache is per process: the API solves in its own
+# threadpool and shares it across requests, while optimize_squad_batch
+# workers each start with an empty one
+squad_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+squad_cache_lock = threading.Lock()
+
+
+def squad_cache_key(
+    players: List[Dict[str, Any]],
+    budget: float,
+    existing_squad: Optional[List[int]],
+    max_transfers: Optional[int],
+    gap: float
+) -> Optional[str]:
+    try:
+        payload = orjson.dumps(
+            [players, budget, existing_squad, max_transfers, gap],
+            option=orjson.OPT_SORT_KEYS
+        )
+    except TypeError:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def clear_squad_cache():
+    with squad_cache_lock:
+        squad_cache.clear()
 
 
 def optimize_squad(
     players: List[Dict[str, Any]], 
     budget: float = DEFAULT_BUDGET,
     existing_squad: Optional[List[int]] = None,
-    max_transfers: Optional[int] = None
+    max_transfers: Optional[int] = None,
+    gap: float = DEFAULT_MIP_GAP
+) -> Dict[str, Any]:
+    
+    key = squad_cache_key(players, budget, existing_squad, max_transfers, gap)
+    if key is not None:
+        with squad_cache_lock:
+            cached = squad_cache.get(key)
+            if cached is not None:
+                squad_cache.move_to_end(key)
+        # Callers get their own copy, so nothing they mutate leaks back in
+        if cached is not None:
+            return copy.deepcopy(cached)
+    
+    result = solve_squad(players, budget, existing_squad, max_transfers, gap)
+    
+    if key is not None:
+        with squad_cache_lock:
+            squad_cache[key] = copy.deepcopy(result)
+            squad_cache.move_to_end(key)
+            while len(squad_cache) > SQUAD_CACHE_SIZE:
+                squad_cache.popitem(last=False)
+    
+    return result
+
+
+def optimize_squad_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    # Module-level so the pool can pickle it
+    return optimize_squad(**scenario)
+
+
+def optimize_squad_batch(
+    scenarios: List[Dict[str, Any]],
+    max_workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    # Each scenario is a dict of optimize_squad keyword arguments; scenarios
+    # share nothing, so they are solved in parallel worker processes and
+    # returned in the order given. Player dicts must be picklable
+    if len(scenarios) <= 1:
+        return [optimize_squad_scenario(scenario) for scenario in scenarios]
+    
+    workers = min(max_workers or os.cpu_count() or 1, len(scenarios))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(optimize_squad_scenario, scenarios))
+
+
+def solve_squad(
+    players: List[Dict[str, Any]], 
+    budget: float = DEFAULT_BUDGET,
+    existing_squad: Optional[List[int]] = None,
+    max_transfers: Optional[int] = None,
+    gap: float = DEFAULT_MIP_GAP
 ) -> Dict[str, Any]:
     
     if not players:
@@ -54,8 +364,6 @@ def optimize_squad(
             'status': 'No players provided'
         }
     
-    prob = LpProblem("FPL_Squad_Optimization", LpMaximize)
-    
     valid_players = [p for p in players if p.get('id') is not None]
     if not valid_players:
         return {
@@ -68,46 +376,31 @@ def optimize_squad(
     player_ids = [p.get('id') for p in valid_players]
     player_lookup = {p.get('id'): p for p in valid_players}
     
-    pick = {pid: LpVariable(f"pick_{pid}", cat=LpBinary) for pid in player_ids}
-    
-    prob += lpSum(
-        player_lookup[pid].get('predicted_points', 0) * pick[pid] 
-        for pid in player_ids
-    )
-    
-    prob += lpSum(pick[pid] for pid in player_ids) == SQUAD_SIZE
-    
-    prob += lpSum(
-        player_lookup[pid].get('price', 0) * pick[pid] 
-        for pid in player_ids
-    ) <= budget
-    
-    for position, required in POSITION_REQUIREMENTS.items():
-        position_players = [
-            pid for pid in player_ids 
-            if normalize_position(player_lookup[pid].get('position', 'MID')) == position
-        ]
-        prob += lpSum(pick[pid] for pid in position_players) == required
-    
-    teams = set(get_player_team(p) for p in valid_players)
-    for team in teams:
-        team_players = [
-            pid for pid in player_ids 
-            if get_player_team(player_lookup[pid]) == team
-        ]
-        prob += lpSum(pick[pid] for pid in team_players) <= MAX_PLAYERS_PER_TEAM
-    
-    if existing_squad and max_transfers is not None:
-        existing_set = set(existing_squad)
-        transfers_out = lpSum(
-            1 - pick[pid] for pid in player_ids if pid in existing_set
+    # Dominated players can be dropped without changing the best squad value;
+    # a repeated id fills several slots at once, so leave such pools whole
+    candidate_ids = player_ids
+    candidate_lookup = player_lookup
+    unique_pool = len(player_lookup) == len(player_ids)
+    if unique_pool:
+        candidate_ids = prune_dominated(player_ids, player_lookup, existing_squad)
+        candidate_lookup = {pid: player_lookup[pid] for pid in candidate_ids}
+    
+    # The usual weekly case, a full squad with one free transfer, is small
+    # enough to enumerate exactly
+    existing_set = set(existing_squad or ())
+    if (
+        unique_pool
+        and max_transfers in (0, 1)
+        and len(existing_squad or ()) == len(existing_set) == SQUAD_SIZE
+        and existing_set <= candidate_lookup.keys()
+    ):
+        status, chosen = solve_with_swaps(
+            candidate_ids, candidate_lookup, budget, existing_squad, max_transfers
+        )
+    else:
+        status, chosen = solve_with_highs(
+            candidate_ids, candidate_lookup, budget, existing_squad, max_transfers, gap
         )
-        prob += transfers_out <= max_transfers
-    
-    solver = PULP_CBC_CMD(msg=0)
-    prob.solve(solver)
-    
-    status = LpStatus[prob.status]
     
     if status != 'Optimal':
         return {
@@ -122,7 +415,7 @@ def optimize_squad(
     expected_points = 0.0
     
     for pid in player_ids:
-        if pick[pid].value() == 1:
+        if pid in chosen:
             player = player_lookup[pid]
             selected_squad.append(player)
             total_cost += player.get('price', 0)
@@ -179,18 +472,21 @@ def select_starting_eleven(squad: List[Dict[str, Any]]) -> Dict[str, Any]:
     best_formation = None
     best_points = -1
     
-    valid_formations = [
-        (3, 4, 3), (3, 5, 2), (4, 3, 3), (4, 4, 2), (4, 5, 1), (5, 3, 2), (5, 4, 1)
-    ]
+    # Prefix sums of each position's sorted points: the best n players at a
+    # position total cumulative[pos][n], so every formation is three lookups
+    cumulative = {
+        pos: [0, *accumulate(p.get('predicted_points', 0) for p in by_position[pos])]
+        for pos in ('DEF', 'MID', 'FWD')
+    }
     
-    for num_def, num_mid, num_fwd in valid_formations:
+    for num_def, num_mid, num_fwd in VALID_FORMATIONS:
         if num_def > len(by_position['DEF']) or num_mid > len(by_position['MID']) or num_fwd > len(by_position['FWD']):
             continue
         
         formation_points = (
-            sum(p.get('predicted_points', 0) for p in by_position['DEF'][:num_def]) +
-            sum(p.get('predicted_points', 0) for p in by_position['MID'][:num_mid]) +
-            sum(p.get('predicted_points', 0) for p in by_position['FWD'][:num_fwd])
+            cumulative['DEF'][num_def] +
+            cumulative['MID'][num_mid] +
+            cumulative['FWD'][num_fwd]
         )
         
         if formation_points > best_points:
@@ -225,10 +521,11 @@ def select_starting_eleven(squad: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 def optimize_with_starting_eleven(
     players: List[Dict[str, Any]], 
-    budget: float = DEFAULT_BUDGET
+    budget: float = DEFAULT_BUDGET,
+    gap: float = DEFAULT_MIP_GAP
 ) -> Dict[str, Any]:
     
-    squad_result = optimize_squad(players, budget)
+    squad_result = optimize_squad(players, budget, gap=gap)
     
     if squad_result['status'] != 'Optimal':
         return squad_result
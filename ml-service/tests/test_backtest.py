@@ -0,0 +1,62 @@
+# Run from ml-service/: python -m unittest discover tests
+import unittest
+
+import numpy as np
+from sklearn.linear_model import Ridge
+
+from ml.backtest import RidgeMoments
+
+
+class RidgeMomentsTest(unittest.TestCase):
+    # The walk-forward backtest re-solves Ridge from running moments instead
+    # of refitting; each week's model must match sklearn's fit on all rows
+    # seen so far
+
+    def make_weeks(self, seed, n_weeks=12):
+        rng = np.random.default_rng(seed)
+        weeks = []
+        for _ in range(n_weeks):
+            n = int(rng.integers(20, 300))
+            # Shaped like the backtest features: point averages, their
+            # difference and average minutes, stored as float32 upstream
+            points = rng.gamma(2.0, 1.5, size=(n, 2))
+            minutes = rng.uniform(0, 90, size=(n, 1))
+            X = np.hstack([points, points[:, 1:] - points[:, :1], minutes])
+            X = X.astype(np.float32).astype(np.float64)
+            y = X @ np.array([0.4, 0.3, 0.1, 0.02]) + rng.normal(0, 2, n)
+            weeks.append((X, y))
+        return weeks
+
+    def test_matches_sklearn_ridge_every_week(self):
+        for seed in range(5):
+            weeks = self.make_weeks(seed)
+            moments = RidgeMoments(weeks[0][0].shape[1])
+            seen_X, seen_y = [], []
+            for week, (X, y) in enumerate(weeks):
+                moments.update(X, y)
+                seen_X.append(X)
+                seen_y.append(y)
+
+                with self.subTest(seed=seed, week=week):
+                    coef, intercept = moments.solve(alpha=1.0)
+                    ridge = Ridge(alpha=1.0).fit(np.vstack(seen_X), np.concatenate(seen_y))
+                    np.testing.assert_allclose(coef, ridge.coef_, rtol=1e-7, atol=1e-10)
+                    self.assertAlmostEqual(intercept, ridge.intercept_, places=8)
+
+    def test_other_alphas(self):
+        weeks = self.make_weeks(11, n_weeks=4)
+        moments = RidgeMoments(4)
+        for X, y in weeks:
+            moments.update(X, y)
+        X_all = np.vstack([X for X, _ in weeks])
+        y_all = np.concatenate([y for _, y in weeks])
+        for alpha in (0.1, 10.0):
+            with self.subTest(alpha=alpha):
+                coef, intercept = moments.solve(alpha=alpha)
+                ridge = Ridge(alpha=alpha).fit(X_all, y_all)
+                np.testing.assert_allclose(coef, ridge.coef_, rtol=1e-7, atol=1e-10)
+                self.assertAlmostEqual(intercept, ridge.intercept_, places=8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# Run from ml-service/: python -m unittest discover tests
+import random
+import unittest
+
+from optimization.team_optimizer import (
+    optimize_squad,
+    prune_dominated,
+    solve_with_highs,
+    solve_with_swaps,
+)
+
+PRICES = [4.0, 4.5, 5.0, 5.5, 6.0, 7.5, 9.0, 12.0]
+
+
+def make_pool(seed, size):
+    rng = random.Random(seed)
+    n_teams = rng.choice([6, 20])
+    players = [
+        {
+            'id': i,
+            'position': rng.choice(['GKP', 'DEF', 'MID', 'FWD']),
+            'price': rng.choice(PRICES),
+            # Coarse points so ties between squads actually happen
+            'predicted_points': rng.choice([0.0, 1.0, 2.0, round(rng.uniform(0, 9), 1)]),
+            'team_name': f'T{rng.randrange(n_teams)}',
+        }
+        for i in range(size)
+    ]
+    return rng, players
+
+
+def squad_points(lookup, chosen):
+    return sum(lookup[pid]['predicted_points'] for pid in chosen)
+
+
+class SwapEnumerationTest(unittest.TestCase):
+    # solve_with_swaps must find the same optimum as the MIP whenever the
+    # existing squad is full and at most one transfer is allowed
+
+    def check(self, seed, max_transfers):
+        rng, players = make_pool(seed, [40, 120, 300][seed % 3])
+        ids = [p['id'] for p in players]
+        lookup = {p['id']: p for p in players}
+        budget = rng.choice([70.0, 85.0, 100.0])
+
+        if rng.random() < 0.7:
+            # Near-optimal squads, sometimes with one player swapped out, so
+            # most cases are feasible
+            status, chosen = solve_with_highs(ids, lookup, budget + rng.choice([0.0, 3.0]), gap=0)
+            existing = sorted(chosen) if status == 'Optimal' else rng.sample(ids, 15)
+            if status == 'Optimal' and rng.random() < 0.5:
+                existing[rng.randrange(15)] = rng.choice([i for i in ids if i not in existing])
+        else:
+            existing = rng.sample(ids, 15)
+
+        mip_status, mip_chosen = solve_with_highs(
+            ids, lookup, budget, existing, max_transfers, gap=0
+        )
+        swap_status, swap_chosen = solve_with_swaps(ids, lookup, budget, existing, max_transfers)
+
+        self.assertEqual(swap_status, mip_status)
+        if swap_status != 'Optimal':
+            return
+        self.assertEqual(len(swap_chosen), 15)
+        self.assertLessEqual(len(set(existing) - swap_chosen), max_transfers)
+        self.assertLessEqual(sum(lookup[pid]['price'] for pid in swap_chosen), budget + 1e-9)
+        self.assertAlmostEqual(
+            squad_points(lookup, swap_chosen), squad_points(lookup, mip_chosen), places=6
+        )
+
+    def test_no_transfers_matches_mip(self):
+        for seed in range(30):
+            with self.subTest(seed=seed):
+                self.check(seed, 0)
+
+    def test_one_transfer_matches_mip(self):
+        for seed in range(30, 90):
+            with self.subTest(seed=seed):
+                self.check(seed, 1)
+
+    def test_optimize_squad_uses_exact_swaps(self):
+        rng, players = make_pool(7, 200)
+        _, chosen = solve_with_highs(
+            [p['id'] for p in players], {p['id']: p for p in players}, 100.0, gap=0
+        )
+        existing = sorted(chosen)
+        for max_transfers in (0, 1):
+            result = optimize_squad(players, 100.0, existing, max_transfers)
+            self.assertEqual(result['status'], 'Optimal')
+            picked = {p['id'] for p in result['squad']}
+            self.assertLessEqual(len(set(existing) - picked), max_transfers)
+
+
+class DominancePruningTest(unittest.TestCase):
+    # Dropping dominated players must never change the best squad value,
+    # with or without an existing squad and transfer limit
+
+    def test_pruned_pool_keeps_optimum(self):
+        for seed in range(40):
+            with self.subTest(seed=seed):
+                rng, players = make_pool(seed, [60, 150, 400][seed % 3])
+                ids = [p['id'] for p in players]
+                lookup = {p['id']: p for p in players}
+                budget = rng.choice([80.0, 100.0])
+                existing, max_transfers = None, None
+                if seed % 2:
+                    existing, max_transfers = rng.sample(ids, 15), rng.randrange(4)
+
+                pruned = prune_dominated(ids, lookup, existing)
+                self.assertTrue(set(existing or ()) <= set(pruned))
+
+                full_status, full_chosen = solve_with_highs(
+                    ids, lookup, budget, existing, max_transfers, gap=0
+                )
+                pruned_status, pruned_chosen = solve_with_highs(
+                    pruned, {pid: lookup[pid] for pid in pruned}, budget,
+                    existing, max_transfers, gap=0
+                )
+                self.assertEqual(pruned_status, full_status)
+                if full_status == 'Optimal':
+                    self.assertAlmostEqual(
+                        squad_points(lookup, pruned_chosen),
+                        squad_points(lookup, full_chosen),
+                        places=6
+                    )
+
+    def test_pruning_drops_players(self):
+        _, players = make_pool(3, 400)
+        ids = [p['id'] for p in players]
+        pruned = prune_dominated(ids, {p['id']: p for p in players})
+        self.assertLess(len(pruned), len(ids))
+        self.assertEqual(pruned, [pid for pid in ids if pid in set(pruned)])
+
+
+if __name__ == '__main__':
+    unittest.main()